@@ -1,9 +1,18 @@
 import streamlit as st
 import google.generativeai as genai
-import json
+import hashlib
+import orjson
 import re
+import sqlite3
+import sys
+import uuid
+from bisect import bisect_left
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from constants import PRODUCT_CATALOG, PRODUCTS, VOLUME_DISCOUNTS, GRADE_PREMIUMS, DELIVERY_COSTS, GST_RATE, GEMINI_MODEL, GEMINI_CACHE_MODEL, CONTEXT_CACHE_MIN_TOKENS, CHARS_PER_TOKEN, Quote, QuoteError
 
 # Page configuration
 st.set_page_config(
@@ -21,147 +30,206 @@ except:
 if not GEMINI_API_KEY:
     GEMINI_API_KEY = st.sidebar.text_input("Gemini API Key (required for AI features)", type="password")
 
-model = None
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        st.sidebar.success("✅ Gemini AI Active")
-    except Exception as e:
-        st.sidebar.error(f"⚠️ Gemini API error: {e}")
-        model = None
+SESSIONS_DB = "sessions.db"
 
-# Product catalog
-PRODUCT_CATALOG = """
-PRODUCT CATALOG:
-1. Ashwagandha Extract
-   - Specifications: 2.5%, 5%, 10% Withanolides
-   - Base prices: ₹1,800/kg, ₹2,800/kg, ₹3,600/kg
-   - MOQ: 25kg, 25kg, 20kg
-
-2. Boswellia Extract
-   - Specifications: 65%, 85% Boswellic Acid
-   - Base prices: ₹2,200/kg, ₹3,200/kg
-   - MOQ: 25kg, 20kg
-
-3. Curcumin Extract
-   - Specifications: 90%, 95%, 98% Purity
-   - Base prices: ₹2,500/kg, ₹3,000/kg, ₹3,800/kg
-   - MOQ: 25kg, 25kg, 20kg
-
-4. Neem Extract
-   - Specifications: 1%, 5% Azadirachtin
-   - Base prices: ₹1,500/kg, ₹2,600/kg
-   - MOQ: 30kg, 25kg
-
-5. Tulsi Extract
-   - Specifications: 2%, 5% Ursolic Acid
-   - Base prices: ₹1,700/kg, ₹2,400/kg
-   - MOQ: 30kg, 25kg
-
-PRICING STRUCTURE:
-- Volume Discounts: 1-24kg: 0%, 25-99kg: 10%, 100-499kg: 15%, 500+kg: 20%
-- Grade Premiums: Pharmaceutical: +20%, Cosmetic: +10%, Food: 0%
-- Delivery: Mumbai: ₹3,500, Delhi: ₹4,200, Bangalore: ₹4,800, Pune: ₹3,200, Ujjain/Local: ₹1,000
-- GST: 18% on total
-"""
+# Order context fields, in the order calculate_quotation takes them
+ORDER_FIELDS = ("product", "specification", "quantity", "grade", "city")
 
-# Products data for calculation
-PRODUCTS = {
-    "ashwagandha": {
-        "name": "Ashwagandha Extract",
-        "unit": "Withanolides",
-        "specifications": {
-            "2.5%": {"base_price": 1800, "moq": 25},
-            "5%": {"base_price": 2800, "moq": 25},
-            "10%": {"base_price": 3600, "moq": 20}
-        }
-    },
-    "boswellia": {
-        "name": "Boswellia Extract",
-        "unit": "Boswellic Acid",
-        "specifications": {
-            "65%": {"base_price": 2200, "moq": 25},
-            "85%": {"base_price": 3200, "moq": 20}
-        }
-    },
-    "curcumin": {
-        "name": "Curcumin Extract",
-        "unit": "Purity",
-        "specifications": {
-            "90%": {"base_price": 2500, "moq": 25},
-            "95%": {"base_price": 3000, "moq": 25},
-            "98%": {"base_price": 3800, "moq": 20}
-        }
-    },
-    "neem": {
-        "name": "Neem Extract",
-        "unit": "Azadirachtin",
-        "specifications": {
-            "1%": {"base_price": 1500, "moq": 30},
-            "5%": {"base_price": 2600, "moq": 25}
-        }
-    },
-    "tulsi": {
-        "name": "Tulsi Extract",
-        "unit": "Ursolic Acid",
-        "specifications": {
-            "2%": {"base_price": 1700, "moq": 30},
-            "5%": {"base_price": 2400, "moq": 25}
-        }
-    }
+# Display names, so quotes don't re-title the same strings every time
+_GRADE_TITLE = {grade: grade.title() for grade in GRADE_PREMIUMS}
+_CITY_TITLE = {city: city.title() for city in DELIVERY_COSTS}
+
+# Number of recent messages sent to Gemini as conversation history
+LLM_WINDOW_SIZE = 10
+
+# Flat (product, specification) -> (base_price, moq, name, unit) table: one lookup per quote
+_PRICE_TABLE = {
+    (sys.intern(product_key), sys.intern(spec)): (spec_info["base_price"], spec_info["moq"], product_info["name"], product_info["unit"])
+    for product_key, product_info in PRODUCTS.items()
+    for spec, spec_info in product_info["specifications"].items()
 }
 
-VOLUME_DISCOUNTS = {
-    (1, 24): 0,
-    (25, 99): 10,
-    (100, 499): 15,
-    (500, float('inf')): 20
+# Interned key for every product, spec, grade and city. Parsed and Gemini-supplied values are
+# swapped for these so table lookups compare by identity instead of character by character
+_CANONICAL = {
+    key: sys.intern(key)
+    for key in chain(PRODUCTS, (spec for _, spec in _PRICE_TABLE), GRADE_PREMIUMS, DELIVERY_COSTS)
 }
 
-GRADE_PREMIUMS = {
-    "pharmaceutical": 20,
-    "cosmetic": 10,
-    "food": 0
+# Volume tiers as parallel arrays, sorted by upper bound, for bisect lookup
+_TIER_UB = [max_qty for _, max_qty in VOLUME_DISCOUNTS]
+_TIER_PCT = list(VOLUME_DISCOUNTS.values())
+_TIER_LABEL = [f"{min_qty}-{max_qty}kg" if max_qty != float('inf') else f"{min_qty}+kg" for min_qty, max_qty in VOLUME_DISCOUNTS]
+_TIER_MIN = next(iter(VOLUME_DISCOUNTS))[0]
+
+PROMPT_CACHE_TTL = timedelta(hours=1)
+
+# Static part of every Gemini request - sent once as a cached system instruction
+SYSTEM_PROMPT = f"""You are an AI sales assistant for Alchemy Chemicals, a premium herbal extract manufacturer. 
+You help customers get quotations and answer questions about products.
+
+{PRODUCT_CATALOG}
+
+Each request contains the CONVERSATION HISTORY, the CURRENT ORDER CONTEXT and the NEW CUSTOMER MESSAGE.
+
+INSTRUCTIONS:
+1. First, determine the customer's intent:
+   - Are they asking for information? (product list, prices, MOQs, etc.)
+   - Are they trying to place an order?
+   - Are they greeting you?
+   - Are they asking for help?
+
+2. If they're asking for information, provide it directly. Don't try to extract order details.
+   - "what products do you have?" -> List all products
+   - "minimum order values" -> Show MOQ for each product
+   - "prices" -> Show pricing structure
+
+3. If they're placing an order or providing order details, extract and update the order context.
+
+4. Respond naturally and helpfully based on the intent.
+
+5. Return your response in this JSON format:
+{{
+    "response": "Your natural language response to the customer",
+    "intent": "greeting/information/order/help",
+    "order_context": {{
+        "product": "product name if mentioned/updated or null",
+        "specification": "spec if mentioned or null",
+        "quantity": quantity if mentioned or null,
+        "grade": "grade if mentioned or null",
+        "city": "city if mentioned or null"
+    }},
+    "should_generate_quote": true/false
+}}
+
+IMPORTANT:
+- For information queries, don't extract order details
+- Handle typos and variations (ashwaganda->ashwagandha, cometic->cosmetic, etc.)
+- Keep previous order context unless explicitly changed
+- Only set should_generate_quote to true when ALL order details are complete
+"""
+
+# Structured output schema - Gemini replies with exactly this JSON object
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "response": {"type": "string"},
+        "intent": {"type": "string"},
+        "order_context": {
+            "type": "object",
+            "properties": {
+                "product": {"type": "string", "nullable": True},
+                "specification": {"type": "string", "nullable": True},
+                "quantity": {"type": "integer", "nullable": True},
+                "grade": {"type": "string", "nullable": True},
+                "city": {"type": "string", "nullable": True}
+            }
+        },
+        "should_generate_quote": {"type": "boolean"}
+    },
+    "required": ["response", "intent", "order_context", "should_generate_quote"]
 }
 
-DELIVERY_COSTS = {
-    "mumbai": 3500,
-    "delhi": 4200,
-    "bangalore": 4800,
-    "pune": 3200,
-    "ujjain": 1000,
-    "local": 1000
+GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=RESPONSE_SCHEMA
+)
+
+# Patterns for the deterministic parser
+_QTY_RE = re.compile(r'(\d+)\s*kg')
+_PCT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+_KEYWORD_KINDS = {
+    **{product_key: "product" for product_key in PRODUCTS},
+    **{grade: "grade" for grade in GRADE_PREMIUMS},
+    **{city: "city" for city in DELIVERY_COSTS}
 }
+_KEYWORD_RE = re.compile(r'\b(?:' + "|".join(re.escape(k) for k in sorted(_KEYWORD_KINDS, key=len, reverse=True)) + r')\b')
+
+# Opening of the "response" string in a streamed JSON reply
+_REPLY_START_RE = re.compile(r'"response"\s*:\s*"')
 
-GST_RATE = 0.18
+# Per-turn part of the request, filled in with str.format_map
+_PROMPT_TEMPLATE = """CONVERSATION HISTORY:
+{history}
+
+CURRENT ORDER CONTEXT (what we know so far):
+{order_status}
+
+NEW CUSTOMER MESSAGE: "{user_message}"
+"""
+
+# Explicit caching is only attempted for a prompt big enough to be accepted; a smaller one
+# would cost a failed CachedContent.create call on every model build
+PROMPT_CACHEABLE = len(SYSTEM_PROMPT) // CHARS_PER_TOKEN >= CONTEXT_CACHE_MIN_TOKENS
+
+# Fingerprint of the static prompt; passed to get_model so edits to the catalog or instructions build a new model
+PROMPT_DIGEST = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:16]
+
+@st.cache_resource(ttl=PROMPT_CACHE_TTL, show_spinner=False)
+def get_model(api_key: str, prompt_digest: str):
+    """Build the Gemini model once and share it across reruns and sessions
+    
+    The system prompt and catalog come from the context cache when possible; the
+    resource expires with the cache so both are recreated together."""
+    genai.configure(api_key=api_key)
+    if PROMPT_CACHEABLE:
+        try:
+            cache = genai.caching.CachedContent.create(
+                model=GEMINI_CACHE_MODEL,
+                display_name=f"alchemy-sales-prompt-{prompt_digest}",
+                system_instruction=SYSTEM_PROMPT,
+                ttl=PROMPT_CACHE_TTL
+            )
+            return genai.GenerativeModel.from_cached_content(cached_content=cache, generation_config=GENERATION_CONFIG)
+        except Exception:
+            pass
+    # Prompt too small to cache, or caching failed; the static prefix as
+    # system instruction still qualifies for implicit caching
+    return genai.GenerativeModel(GEMINI_MODEL, system_instruction=SYSTEM_PROMPT, generation_config=GENERATION_CONFIG)
+
+model = None
+if GEMINI_API_KEY:
+    try:
+        model = get_model(GEMINI_API_KEY, PROMPT_DIGEST)
+        st.sidebar.success("✅ Gemini AI Active")
+    except Exception as e:
+        st.sidebar.error(f"⚠️ Gemini API error: {e}")
+        model = None
+
+def order_key(order_context: Dict) -> Tuple:
+    """Freeze an order context into the hashable tuple calculate_quotation is cached on
+    
+    Text fields are lowercased and canonicalized here, once, so equivalent orders share a cache entry."""
+    product, specification, quantity, grade, city = (order_context[field] for field in ORDER_FIELDS)
+    product, grade, city = (value.lower() if isinstance(value, str) else value for value in (product, grade, city))
+    return tuple(_CANONICAL.get(value, value) if isinstance(value, str) else value
+                 for value in (product, specification, quantity, grade, city))
+
+def quote_validity() -> str:
+    """Date until which a quotation issued today is valid"""
+    return (datetime.now() + timedelta(days=7)).strftime("%d %b %Y")
 
 def get_volume_discount(quantity: int) -> Tuple[int, str]:
     """Calculate volume discount based on quantity"""
-    for (min_qty, max_qty), discount in VOLUME_DISCOUNTS.items():
-        if min_qty <= quantity <= max_qty:
-            return discount, f"{min_qty}-{max_qty}kg" if max_qty != float('inf') else f"{min_qty}+kg"
-    return 0, "No discount"
-
-def calculate_quotation(order_data: Dict) -> Dict:
-    """Calculate complete quotation with all pricing components"""
+    if quantity < _TIER_MIN:
+        return 0, "No discount"
+    tier = bisect_left(_TIER_UB, quantity)
+    return _TIER_PCT[tier], _TIER_LABEL[tier]
+
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def calculate_quotation(order: Tuple, valid_until: str) -> Union[Quote, QuoteError]:
+    """Calculate complete quotation with all pricing components
+    
+    order is the (product, specification, quantity, grade, city) tuple from order_key()."""
     try:
-        product = order_data["product"].lower()
-        specification = order_data["specification"]
-        quantity = order_data["quantity"]
-        grade = order_data["grade"].lower()
-        city = order_data["city"].lower()
+        product, specification, quantity, grade, city = order
         
         # Get product details
-        product_info = PRODUCTS[product]
-        spec_info = product_info["specifications"][specification]
-        
-        base_price = spec_info["base_price"]
-        moq = spec_info["moq"]
+        base_price, moq, product_name, unit = _PRICE_TABLE[(product, specification)]
         
         # Check MOQ
         if quantity < moq:
-            return {"error": f"Minimum order quantity is {moq}kg for this product"}
+            return QuoteError(f"Minimum order quantity is {moq}kg for this product")
         
         # Calculate base total
         subtotal = base_price * quantity
@@ -186,58 +254,59 @@ def calculate_quotation(order_data: Dict) -> Dict:
         # Final total
         total = subtotal_before_gst + gst_amount
         
-        return {
-            "product_name": product_info["name"],
-            "specification": f"{specification} {product_info['unit']}",
-            "grade": grade.title(),
-            "quantity": quantity,
-            "base_price": base_price,
-            "subtotal": subtotal,
-            "volume_discount_pct": volume_discount_pct,
-            "volume_tier": volume_tier,
-            "volume_discount_amt": volume_discount_amt,
-            "grade_premium_pct": grade_premium_pct,
-            "grade_premium_amt": grade_premium_amt,
-            "delivery_city": city.title(),
-            "delivery_cost": delivery_cost,
-            "subtotal_before_gst": subtotal_before_gst,
-            "gst_amount": gst_amount,
-            "total": total,
-            "moq": moq,
-            "lead_time": "2-3 days",
-            "validity": (datetime.now() + timedelta(days=7)).strftime("%d %b %Y")
-        }
+        return Quote(
+            product_name=product_name,
+            specification=f"{specification} {unit}",
+            grade=_GRADE_TITLE.get(grade) or grade.title(),
+            quantity=quantity,
+            base_price=base_price,
+            subtotal=subtotal,
+            volume_discount_pct=volume_discount_pct,
+            volume_tier=volume_tier,
+            volume_discount_amt=volume_discount_amt,
+            grade_premium_pct=grade_premium_pct,
+            grade_premium_amt=grade_premium_amt,
+            delivery_city=_CITY_TITLE.get(city) or city.title(),
+            delivery_cost=delivery_cost,
+            subtotal_before_gst=subtotal_before_gst,
+            gst_amount=gst_amount,
+            total=total,
+            moq=moq,
+            lead_time="2-3 days",
+            validity=valid_until
+        )
     except Exception as e:
-        return {"error": f"Unable to calculate quotation: {str(e)}"}
+        return QuoteError(f"Unable to calculate quotation: {str(e)}")
 
-def format_quotation(quote: Dict) -> str:
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def format_quotation(quote: Union[Quote, QuoteError]) -> str:
     """Format quotation in professional format"""
-    if "error" in quote:
-        return f"❌ {quote['error']}"
+    if isinstance(quote, QuoteError):
+        return f"❌ {quote.error}"
     
     return f"""
 **ALCHEMY CHEMICALS - QUOTATION** 📋
 ---
-**Product:** {quote['product_name']}
-**Specification:** {quote['specification']}
-**Grade:** {quote['grade']}
-**Quantity:** {quote['quantity']}kg
+**Product:** {quote.product_name}
+**Specification:** {quote.specification}
+**Grade:** {quote.grade}
+**Quantity:** {quote.quantity}kg
 
 **💰 Pricing Breakdown:**
-• Base Price: ₹{quote['base_price']:,}/kg
-• Subtotal: ₹{quote['subtotal']:,}
-• Volume Discount ({quote['volume_tier']} tier): -{quote['volume_discount_pct']}% = **-₹{quote['volume_discount_amt']:,.0f}**
-• Grade Premium ({quote['grade']}): +{quote['grade_premium_pct']}% = **+₹{quote['grade_premium_amt']:,.0f}**
-• Delivery ({quote['delivery_city']}): **₹{quote['delivery_cost']:,}**
-• **Subtotal:** ₹{quote['subtotal_before_gst']:,.0f}
-• GST (18%): ₹{quote['gst_amount']:,.0f}
+• Base Price: ₹{quote.base_price:,}/kg
+• Subtotal: ₹{quote.subtotal:,}
+• Volume Discount ({quote.volume_tier} tier): -{quote.volume_discount_pct}% = **-₹{quote.volume_discount_amt:,.0f}**
+• Grade Premium ({quote.grade}): +{quote.grade_premium_pct}% = **+₹{quote.grade_premium_amt:,.0f}**
+• Delivery ({quote.delivery_city}): **₹{quote.delivery_cost:,}**
+• **Subtotal:** ₹{quote.subtotal_before_gst:,.0f}
+• GST (18%): ₹{quote.gst_amount:,.0f}
 
-**📍 TOTAL: ₹{quote['total']:,.0f}**
+**📍 TOTAL: ₹{quote.total:,.0f}**
 
 **Terms & Conditions:**
-• MOQ: {quote['moq']}kg
-• Lead Time: {quote['lead_time']}
-• Quote Validity: Until {quote['validity']}
+• MOQ: {quote.moq}kg
+• Lead Time: {quote.lead_time}
+• Quote Validity: Until {quote.validity}
 • Certifications: ISO 9001:2015, GMP, FDA
 
 **For order confirmation:** info@alchemychemicals.net
@@ -245,97 +314,229 @@ def format_quotation(quote: Dict) -> str:
 ✨ **Thank you for choosing Alchemy Chemicals!**
 """
 
-def process_with_gemini(user_message: str, conversation_history: list, order_context: Dict) -> tuple:
-    """Let Gemini handle the entire conversation intelligently"""
+def parse_query_simple(query: str) -> Tuple[Optional[str], Optional[str], Optional[int], Optional[str], Optional[str]]:
+    """Deterministically extract (product, specification, quantity, grade, city) from a query"""
+    query_lower = query.lower()
+    
+    # Product, grade and city - first mention of each kind wins
+    found = {}
+    for match in _KEYWORD_RE.finditer(query_lower):
+        keyword = _CANONICAL[match.group()]
+        found.setdefault(_KEYWORD_KINDS[keyword], keyword)
+    
+    qty_match = _QTY_RE.search(query_lower)
+    spec_match = _PCT_RE.search(query_lower)
+    
+    return (
+        found.get("product"),
+        _CANONICAL.get(spec := f"{spec_match.group(1)}%", spec) if spec_match else None,
+        int(qty_match.group(1)) if qty_match else None,
+        found.get("grade"),
+        found.get("city")
+    )
+
+def _stream_reply_field(chunks: Iterable[str], buffer: List[str]) -> Iterator[str]:
+    """Yield the decoded "response" string while the JSON reply streams in.
+    
+    Every raw chunk is appended to buffer so the caller can parse the full reply afterwards."""
+    chunks = iter(chunks)
+    text = ""
+    pos = None
+    for chunk in chunks:
+        buffer.append(chunk)
+        text += chunk
+        
+        if pos is None:
+            match = _REPLY_START_RE.search(text)
+            if not match:
+                continue
+            pos = match.end()
+        
+        # Advance to the end of the value or the last complete escape sequence
+        end = pos
+        closed = False
+        while end < len(text):
+            char = text[end]
+            if char == '"':
+                closed = True
+                break
+            if char != "\\":
+                end += 1
+                continue
+            # \uXXXX needs all six characters, a surrogate pair needs twelve
+            width = 6 if text[end + 1:end + 2] == "u" else 2
+            if width == 6 and text[end + 2:end + 3].lower() == "d" and text[end + 3:end + 4].lower() in "89ab":
+                width = 12
+            if end + width > len(text):
+                break
+            end += width
+        
+        if end > pos:
+            yield orjson.loads(f'"{text[pos:end]}"')
+            pos = end
+        if closed:
+            # Drain the rest of the reply into the buffer
+            for rest in chunks:
+                buffer.append(rest)
+            return
+
+def process_with_gemini(user_message: str, conversation_history: deque, order_context: Dict, outcome: Dict) -> Iterator[str]:
+    """Let Gemini handle the entire conversation intelligently, yielding the reply as it streams.
+    
+    Once the generator is exhausted, outcome holds order_context and should_generate_quote,
+    plus error if the Gemini call failed."""
+    outcome["order_context"] = order_context
+    outcome["should_generate_quote"] = False
+    
+    # Fast path: a complete, well-formed order needs no LLM round-trip
+    # (a parsed quantity always carries "kg", which already marks the message as an order)
+    fields = parse_query_simple(user_message)
+    if all(fields) and fields[:2] in _PRICE_TABLE:
+        st.session_state.fast_path_hits = st.session_state.get("fast_path_hits", 0) + 1
+        order_context.update(zip(ORDER_FIELDS, fields))
+        outcome["should_generate_quote"] = True
+        return
     
     if not model:
-        return "I need Gemini API to work properly. Please add your API key in the sidebar.", order_context
+        yield "I need Gemini API to work properly. Please add your API key in the sidebar."
+        return
     
-    # Build conversation history for context
-    history_text = ""
-    for msg in conversation_history[-10:]:  # Last 10 messages for context
-        role = "Customer" if msg["role"] == "user" else "Assistant"
-        history_text += f"{role}: {msg['content']}\n"
+    # Build conversation history for context (window is already bounded)
+    history_text = "\n".join(
+        f"{'Customer' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+        for msg in conversation_history
+    )
     
-    # Build current order status
-    order_status = json.dumps(order_context, indent=2)
+    # Build current order status - known fields only, to keep the prompt short
+    order_status = "\n".join(
+        f"  {key}: {value}" for key, value in order_context.items() if value is not None
+    ) or "  nothing yet"
     
-    prompt = f"""You are an AI sales assistant for Alchemy Chemicals, a premium herbal extract manufacturer. 
-You help customers get quotations and answer questions about products.
-
-{PRODUCT_CATALOG}
-
-CONVERSATION HISTORY:
-{history_text}
-
-CURRENT ORDER CONTEXT (what we know so far):
-{order_status}
-
-NEW CUSTOMER MESSAGE: "{user_message}"
-
-INSTRUCTIONS:
-1. First, determine the customer's intent:
-   - Are they asking for information? (product list, prices, MOQs, etc.)
-   - Are they trying to place an order?
-   - Are they greeting you?
-   - Are they asking for help?
-
-2. If they're asking for information, provide it directly. Don't try to extract order details.
-   - "what products do you have?" -> List all products
-   - "minimum order values" -> Show MOQ for each product
-   - "prices" -> Show pricing structure
-
-3. If they're placing an order or providing order details, extract and update the order context.
-
-4. Respond naturally and helpfully based on the intent.
-
-5. Return your response in this JSON format:
-{{
-    "response": "Your natural language response to the customer",
-    "intent": "greeting/information/order/help",
-    "order_context": {{
-        "product": "product name if mentioned/updated or null",
-        "specification": "spec if mentioned or null",
-        "quantity": quantity if mentioned or null,
-        "grade": "grade if mentioned or null",
-        "city": "city if mentioned or null"
-    }},
-    "should_generate_quote": true/false
-}}
-
-IMPORTANT:
-- For information queries, don't extract order details
-- Handle typos and variations (ashwaganda->ashwagandha, cometic->cosmetic, etc.)
-- Keep previous order context unless explicitly changed
-- Only set should_generate_quote to true when ALL order details are complete
-"""
-
+    prompt = _PROMPT_TEMPLATE.format_map({
+        "history": history_text,
+        "order_status": order_status,
+        "user_message": user_message
+    })
+    
+    raw_chunks = []
+    streamed = False
+    st.session_state.gemini_calls = st.session_state.get("gemini_calls", 0) + 1
     try:
-        response = model.generate_content(prompt)
-        result = response.text.strip()
+        response = model.generate_content(prompt, stream=True)
+        for piece in _stream_reply_field((chunk.text for chunk in response), raw_chunks):
+            streamed = True
+            yield piece
+        st.session_state.last_usage = response.usage_metadata
         
-        # Extract JSON from response
-        json_match = re.search(r'\{.*\}', result, re.DOTALL)
-        if json_match:
-            parsed = json.loads(json_match.group())
-            
-            # Update order context only with non-null values
-            if parsed.get("order_context"):
-                for key, value in parsed["order_context"].items():
-                    if value is not None:
-                        order_context[key] = value
-            
-            return parsed.get("response", "I understand. How can I help you?"), order_context, parsed.get("should_generate_quote", False)
-            
+        # JSON mode guarantees the reply is the schema object, no extraction needed
+        parsed = orjson.loads("".join(raw_chunks))
     except Exception as e:
-        return f"I encountered an issue: {e}. Could you please rephrase?", order_context, False
+        # Drop the shared model in case its context cache expired server-side; it is rebuilt next turn
+        if model.cached_content:
+            get_model.clear()
+        # The caller shows this in place of any partial reply already streamed
+        outcome["error"] = f"I encountered an issue: {e}. Could you please rephrase?"
+        if not streamed:
+            yield outcome["error"]
+        return
+    
+    if not streamed:
+        yield parsed.get("response", "I understand. How can I help you?")
+    
+    # Update order context only with non-null values
+    if parsed.get("order_context"):
+        for key, value in parsed["order_context"].items():
+            if value is not None:
+                order_context[key] = value
+    
+    outcome["should_generate_quote"] = parsed.get("should_generate_quote", False)
+
+# Session persistence - chat history and order context survive reloads and restarts
+@st.cache_resource
+def get_session_db() -> sqlite3.Connection:
+    """Open the session database shared by all sessions of this server process"""
+    conn = sqlite3.connect(SESSIONS_DB, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS msgs(sid TEXT, idx INT, role TEXT, content TEXT, extra TEXT)")
+    # Databases from before display extras were stored lack the extra column
+    if "extra" not in {row[1] for row in conn.execute("PRAGMA table_info(msgs)")}:
+        conn.execute("ALTER TABLE msgs ADD COLUMN extra TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS msgs_sid_idx ON msgs(sid, idx)")
+    conn.execute("CREATE TABLE IF NOT EXISTS orders(sid TEXT PRIMARY KEY, context TEXT)")
+    conn.commit()
+    return conn
+
+def get_session_id() -> str:
+    """Return this chat's id, kept in the ?sid= query param so a reload resumes it"""
+    sid = st.query_params.get("sid")
+    if not sid:
+        sid = uuid.uuid4().hex
+        st.query_params["sid"] = sid
+    return sid
+
+def add_message(role: str, content: str, **extra):
+    """Record a chat message in the display history, the LLM window and the session database
+    
+    Extra keys (e.g. a quotation's download_name) are stored for display but not sent to the LLM."""
+    message = {"role": role, "content": content}
+    st.session_state.messages.append({**message, **extra})
+    st.session_state.llm_window.append(message)
+    with db:
+        # The index comes from the database, so tabs sharing a sid don't write the same one
+        db.execute(
+            "INSERT INTO msgs SELECT ?, COALESCE(MAX(idx), -1) + 1, ?, ?, ? FROM msgs WHERE sid = ?",
+            (session_id, role, content, orjson.dumps(extra) if extra else None, session_id)
+        )
+
+def save_order_context():
+    """Persist the current order context for this session"""
+    with db:
+        db.execute(
+            "INSERT OR REPLACE INTO orders VALUES (?, ?)",
+            (session_id, orjson.dumps(st.session_state.order_context))
+        )
+
+def show_quote_actions(message: Dict, key: str):
+    """Render the download button and follow-up under a quotation message"""
+    st.download_button(
+        label="📥 Download Quotation",
+        data=message["content"],
+        file_name=message["download_name"],
+        mime="text/plain",
+        key=key
+    )
     
-    return "I'm having trouble understanding. Could you please rephrase?", order_context, False
+    follow_up = "\n**What next?** Modify this quote? Get another product quote? Just let me know! 😊"
+    st.markdown(follow_up)
+
+def show_current_order(order_context: Dict):
+    """Render what is known of the order so far, one column per field"""
+    st.markdown("#### 🛒 Current Order")
+    for column, field in zip(st.columns(len(ORDER_FIELDS)), ORDER_FIELDS):
+        value = order_context[field]
+        with column:
+            if value:
+                st.success(f"✅ {field.title()}: **{value}{'kg' if field == 'quantity' else ''}**")
+            else:
+                st.info(f"⬜ {field.title()}: —")
 
-# Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-    welcome_msg = """👋 **Welcome to Alchemy Chemicals!**
+def show_cache_stats():
+    """Render fast path and Gemini call counters, and token usage of the last Gemini call"""
+    with st.expander("🔧 Cache Stats"):
+        st.markdown(f"""
+        **Fast path / Gemini calls:** {st.session_state.get("fast_path_hits", 0)} / {st.session_state.get("gemini_calls", 0)}
+        """)
+        usage = st.session_state.get("last_usage")
+        if usage:
+            st.markdown(f"""
+            **Last Gemini call:** {usage.prompt_token_count} prompt tokens, {usage.cached_content_token_count} from cache, {usage.candidates_token_count} reply tokens
+            """)
+        # st.cache_data has no public per-function stats, so calculate_quotation has no counter here
+
+db = get_session_db()
+session_id = get_session_id()
+
+welcome_msg = """👋 **Welcome to Alchemy Chemicals!**
 
 I'm your AI sales assistant. I can help you:
 • Get instant quotations for herbal extracts
@@ -352,11 +553,25 @@ I'm your AI sales assistant. I can help you:
 • "Show me prices for Tulsi"
 
 How can I help you today? 😊"""
-    st.session_state.messages.append({"role": "assistant", "content": welcome_msg})
+
+# Initialize session state, resuming a stored session if there is one
+if "messages" not in st.session_state:
+    rows = db.execute("SELECT role, content, extra FROM msgs WHERE sid = ? ORDER BY idx", (session_id,)).fetchall()
+    st.session_state.messages = [
+        {"role": role, "content": content, **(orjson.loads(extra) if extra else {})}
+        for role, content, extra in rows
+    ]
+    # Bounded window of recent messages for the LLM; messages keeps the full history for display
+    st.session_state.llm_window = deque(
+        ({"role": role, "content": content} for role, content, _ in rows), maxlen=LLM_WINDOW_SIZE
+    )
+    if not rows:
+        add_message("assistant", welcome_msg)
 
 # Initialize order context
 if "order_context" not in st.session_state:
-    st.session_state.order_context = {
+    row = db.execute("SELECT context FROM orders WHERE sid = ?", (session_id,)).fetchone()
+    st.session_state.order_context = orjson.loads(row[0]) if row else {
         "product": None,
         "specification": None,
         "quantity": None,
@@ -398,85 +613,84 @@ with st.sidebar:
         """)
     
     st.divider()
-    st.header("🛒 Current Order")
-    
-    if st.session_state.order_context["product"]:
-        st.success(f"✅ Product: **{st.session_state.order_context['product']}**")
-    else:
-        st.info("⬜ Product: —")
-        
-    if st.session_state.order_context["specification"]:
-        st.success(f"✅ Specification: **{st.session_state.order_context['specification']}**")
-    else:
-        st.info("⬜ Specification: —")
-        
-    if st.session_state.order_context["quantity"]:
-        st.success(f"✅ Quantity: **{st.session_state.order_context['quantity']}kg**")
-    else:
-        st.info("⬜ Quantity: —")
-        
-    if st.session_state.order_context["grade"]:
-        st.success(f"✅ Grade: **{st.session_state.order_context['grade']}**")
-    else:
-        st.info("⬜ Grade: —")
-        
-    if st.session_state.order_context["city"]:
-        st.success(f"✅ City: **{st.session_state.order_context['city']}**")
-    else:
-        st.info("⬜ City: —")
     
     # Clear order button
     if st.button("🔄 Clear Order"):
         st.session_state.order_context = {k: None for k in st.session_state.order_context}
+        save_order_context()
         st.rerun()
 
-# Main chat interface
-st.markdown("### 💬 Chat with me")
-
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# Chat input
-if prompt := st.chat_input("Ask me anything about our products or place an order..."):
-    # Add user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
+# Main chat interface - a fragment, so a chat turn reruns only this block instead of the whole page
+@st.fragment
+def chat_fragment():
+    st.markdown("### 💬 Chat with me")
+    
+    # Filled in after the turn below, so it shows the order as this turn left it
+    order_panel = st.container()
+    
+    # Display chat history
+    for idx, message in enumerate(st.session_state.messages):
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            if message.get("download_name"):
+                show_quote_actions(message, key=f"download_{idx}")
     
-    # Process with Gemini
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response, updated_context, should_quote = process_with_gemini(
+    # Chat input
+    if prompt := st.chat_input("Ask me anything about our products or place an order..."):
+        # Add user message
+        add_message("user", prompt)
+        with st.chat_message("user"):
+            st.markdown(prompt)
+        
+        # Process with Gemini
+        with st.chat_message("assistant"):
+            outcome = {}
+            reply = process_with_gemini(
                 prompt, 
-                st.session_state.messages,
-                st.session_state.order_context
+                st.session_state.llm_window,
+                st.session_state.order_context,
+                outcome
             )
+            # Spinner only until the first piece of the reply arrives
+            with st.spinner("Thinking..."):
+                first_piece = next(reply, None)
+            # The fast path goes straight to the quotation without a reply
+            if first_piece is not None:
+                reply_slot = st.empty()
+                response = reply_slot.write_stream(chain([first_piece], reply))
+                if "error" in outcome:
+                    # Don't keep a reply that broke off halfway
+                    response = outcome["error"]
+                    reply_slot.markdown(response)
+                add_message("assistant", response)
             
             # Update order context
-            st.session_state.order_context = updated_context
+            st.session_state.order_context = outcome["order_context"]
+            save_order_context()
             
             # Generate quotation if ready
-            if should_quote:
-                quotation = calculate_quotation(st.session_state.order_context)
+            if outcome["should_generate_quote"]:
+                quotation = calculate_quotation(order_key(st.session_state.order_context), quote_validity())
                 formatted_quote = format_quotation(quotation)
                 st.markdown(formatted_quote)
-                st.session_state.messages.append({"role": "assistant", "content": formatted_quote})
                 
-                if "error" not in quotation:
-                    st.download_button(
-                        label="📥 Download Quotation",
-                        data=formatted_quote,
-                        file_name=f"quotation_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
-                        mime="text/plain"
+                if isinstance(quotation, Quote):
+                    add_message(
+                        "assistant", formatted_quote,
+                        download_name=f"quotation_{datetime.now().strftime('%Y%m%d_%H%M')}.txt"
                     )
-                    
-                    follow_up = "\n**What next?** Modify this quote? Get another product quote? Just let me know! 😊"
-                    st.markdown(follow_up)
-            else:
-                st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                    show_quote_actions(st.session_state.messages[-1], key=f"download_{len(st.session_state.messages) - 1}")
+                else:
+                    add_message("assistant", formatted_quote)
+    
+    with order_panel:
+        show_current_order(st.session_state.order_context)
+    
+    # Cache counters for debugging, only with ?debug=1 - after the turn so they include it
+    if st.query_params.get("debug") == "1":
+        show_cache_stats()
+
+chat_fragment()
 
 # Info section
 with st.expander("ℹ️ How to Use"):
@@ -1,9 +1,14 @@
 import streamlit as st
-import google.generativeai as genai
 import json
 import re
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from constants import CHARS_PER_TOKEN, CONTEXT_CACHE_MIN_TOKENS, GEMINI_CACHE_MODEL, GEMINI_MODEL
+
+if TYPE_CHECKING:
+    from google.generativeai import GenerativeModel
 
 # Page configuration
 st.set_page_config(
@@ -22,11 +27,68 @@ except:
 if not GEMINI_API_KEY:
     GEMINI_API_KEY = st.sidebar.text_input("Gemini API Key (optional - uses fallback parser if empty)", type="password")
 
+# Static parsing instructions, kept ahead of the per-query part so the prefix can be cached
+PARSE_INSTRUCTIONS = """Parse herbal extract quotation requests and extract the following information:
+    - Product name (ashwagandha/boswellia/curcumin/neem/tulsi)
+    - Specification/concentration (e.g., 5%, 10%)
+    - Quantity in kg
+    - Grade (pharmaceutical/cosmetic/food)
+    - Delivery city
+
+    Use values from the previous context if the query doesn't provide new information for those fields.
+    If any field is missing or unknown, set it as null.
+"""
+
+# JSON mode - Gemini replies with exactly this object, no prose to strip
+# (a plain dict, so building it doesn't need google.generativeai imported)
+PARSE_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {
+            "product": {"type": "string", "nullable": True},
+            "specification": {"type": "string", "nullable": True},
+            "quantity": {"type": "integer", "nullable": True},
+            "grade": {"type": "string", "nullable": True},
+            "city": {"type": "string", "nullable": True}
+        }
+    }
+}
+
+PARSE_CACHE_TTL = timedelta(hours=1)
+# Explicit caching is only attempted for instructions big enough to be accepted; smaller ones
+# would cost a failed CachedContent.create call on every model build
+PARSE_CACHEABLE = len(PARSE_INSTRUCTIONS) // CHARS_PER_TOKEN >= CONTEXT_CACHE_MIN_TOKENS
+
+@st.cache_resource(ttl=PARSE_CACHE_TTL, show_spinner=False)
+def get_model(api_key: str) -> Tuple["GenerativeModel", str]:
+    """Build the parsing model once, shared across reruns and sessions
+    
+    Returns the model and the prefix each prompt still needs - empty when the
+    instructions come from the context cache, which expires with this resource."""
+    # Imported here so sessions without an API key never pay for the SDK import
+    import google.generativeai as genai
+    
+    genai.configure(api_key=api_key)
+    if PARSE_CACHEABLE:
+        try:
+            cache = genai.caching.CachedContent.create(
+                model=GEMINI_CACHE_MODEL,
+                display_name="alchemy-parse-prompt",
+                system_instruction=PARSE_INSTRUCTIONS,
+                ttl=PARSE_CACHE_TTL
+            )
+            return genai.GenerativeModel.from_cached_content(cached_content=cache, generation_config=PARSE_GENERATION_CONFIG), ""
+        except Exception:
+            pass
+    # Instructions too small to cache, or caching failed - send them with every prompt
+    return genai.GenerativeModel(GEMINI_MODEL, generation_config=PARSE_GENERATION_CONFIG), PARSE_INSTRUCTIONS + "\n"
+
 model = None
+prompt_prefix = ""
 if GEMINI_API_KEY:
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-pro')
+        model, prompt_prefix = get_model(GEMINI_API_KEY)
         st.sidebar.success("✅ Gemini AI Active")
     except Exception as e:
         st.sidebar.warning(f"⚠️ Gemini API error: Using fallback parser")
@@ -110,111 +172,200 @@ DELIVERY_COSTS = {
 
 GST_RATE = 0.18
 
-def parse_query_with_ai(query: str, context: Dict) -> Dict:
-    """Use Gemini AI to parse natural language query into structured data with conversation context"""
-    
-    if not model:
-        return parse_query_simple(query, context)
+# Flat (product, specification) -> (base_price, moq, name, unit) table: one lookup per quote
+_PRICE_TABLE = {
+    (product_key, spec): (spec_info["base_price"], spec_info["moq"], product_info["name"], product_info["unit"])
+    for product_key, product_info in PRODUCTS.items()
+    for spec, spec_info in product_info["specifications"].items()
+}
+
+# Volume tiers by lower bound, for bisect lookup
+_TIER_THRESHOLDS = [min_qty for min_qty, _ in VOLUME_DISCOUNTS]
+_TIER_DATA = [
+    (discount, f"{min_qty}-{max_qty}kg" if max_qty != float('inf') else f"{min_qty}+kg")
+    for (min_qty, max_qty), discount in VOLUME_DISCOUNTS.items()
+]
+
+# Compiled once instead of on every parse
+_QTY_RE = re.compile(r'(\d+)\s*kg')
+_PCT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+_BARE_INT_RE = re.compile(r'^\d+$')
+_BARE_NUMBER_RE = re.compile(r'^\d+(?:\.\d+)?$')
+# Greeting, help and thank-you phrases for is_greeting_or_general
+_GREETINGS = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'namaste']
+_HELP_TERMS = ['help', 'how to use', 'what can you do', 'how does this work']
+_THANK_TERMS = ['thank', 'thanks', 'appreciate']
+# One alternation with a named group per intent. Greetings need word boundaries to avoid
+# false positives (like "Delhi" containing "hi"); help and thanks match anywhere.
+_INTENT_RE = re.compile(
+    r'(?P<greet>\b(?:' + "|".join(re.escape(greeting) for greeting in _GREETINGS) + r')\b)'
+    r'|(?P<help>' + "|".join(re.escape(term) for term in _HELP_TERMS) + r')'
+    r'|(?P<thank>' + "|".join(re.escape(term) for term in _THANK_TERMS) + r')'
+)
+# Greetings that start a new quotation
+_RESET_GREETING_RE = re.compile(r'\b(?:hi|hello|hey)\b')
+
+# Product, grade and city names in one alternation so the query is scanned once.
+# Longest first, so "pharmaceutical" wins over "pharma" at the same position.
+_KEYWORD_KINDS = {
+    **{product_key: "product" for product_key in PRODUCTS},
+    **{grade_key: "grade" for grade_key in GRADE_PREMIUMS},
+    **{city_key: "city" for city_key in DELIVERY_COSTS}
+}
+_KEYWORD_RE = re.compile("|".join(re.escape(k) for k in sorted(_KEYWORD_KINDS, key=len, reverse=True)))
+
+def _read_json_object(chunks: Iterable[str]) -> str:
+    """Read streamed text until the first top-level JSON object closes, and return that object"""
+    text = ""
+    start = None
+    depth = 0
+    in_string = escaped = False
+    for chunk in chunks:
+        scan_from = len(text)
+        text += chunk
+        for i in range(scan_from, len(text)):
+            char = text[i]
+            if start is None:
+                # Skip anything (e.g. whitespace) before the object
+                if char == "{":
+                    start, depth = i, 1
+            elif in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+    raise ValueError("No complete JSON object in Gemini reply")
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def _parse_with_gemini(query: str, context_items: Tuple, model_name: str, prefix: str, _model: "GenerativeModel") -> Dict:
+    """Ask Gemini to parse a normalized query; cached so repeat prompts skip the API call
+    
+    The model name and prompt prefix are part of the cache key, so replies from one model
+    setup are never served to another; _model itself is left out of the key.
+    Raises on any failure, so failed calls aren't cached and the caller can fall back."""
+    context = dict(context_items)
     
     # Include context in the prompt
     context_str = "\n".join([f"    - {k}: {v}" for k, v in context.items() if v is not None])
     context_info = f"\n\nPrevious conversation context (already known):\n{context_str}" if context_str else ""
     
-    prompt = f"""Parse this herbal extract quotation request and extract the following information:
-    - Product name (ashwagandha/boswellia/curcumin/neem/tulsi)
-    - Specification/concentration (e.g., 5%, 10%)
-    - Quantity in kg
-    - Grade (pharmaceutical/cosmetic/food)
-    - Delivery city
-
+    # Only the per-query tail changes between calls
+    prompt = f"""{prefix}
     Query: "{query}"{context_info}
-
-    Return ONLY a JSON object with keys: product, specification, quantity, grade, city
-    Use values from the previous context if the query doesn't provide new information for those fields.
-    If any field is missing or unknown, set it as null.
-    Do not include any explanatory text, only the JSON.
     """
     
+    # Stream the reply and stop reading as soon as the JSON object is complete. The rest of the
+    # stream is abandoned, not resolved - reading it would wait for the tokens this skips; the
+    # client cancels the call once the response is garbage-collected on return
+    response = _model.generate_content(prompt, stream=True)
+    parsed = json.loads(_read_json_object(chunk.text for chunk in response))
+    # Merge with context - new values override old ones
+    for key, value in parsed.items():
+        if value is not None:
+            context[key] = value
+    return context
+
+def parse_query_with_ai(query: str, context: Dict) -> Dict:
+    """Use Gemini AI to parse natural language query into structured data with conversation context"""
+    
+    # No model, or the regex parser finds all five fields in the query itself - no need for Gemini
+    scanned = _scan_query(query)
+    if not model or None not in scanned:
+        return parse_query_simple(query, context, scanned)
+    
     try:
-        response = model.generate_content(prompt)
-        result = response.text
-        
-        # Try to extract JSON from response
-        json_match = re.search(r'\{.*\}', result, re.DOTALL)
-        if json_match:
-            parsed = json.loads(json_match.group())
-            # Merge with context - new values override old ones
-            merged = context.copy()
-            for key, value in parsed.items():
-                if value is not None:
-                    merged[key] = value
-            return merged
+        # Normalize case and whitespace so trivially different prompts share a cache entry
+        return _parse_with_gemini(" ".join(query.lower().split()), tuple(context.items()), model.model_name, prompt_prefix, model)
     except Exception as e:
+        # Drop the shared model in case its cache expired server-side; it is rebuilt next rerun
+        if not prompt_prefix:
+            get_model.clear()
         # Silently fall back to regex parser - no need to show error
-        pass
     
     # Fallback to simple regex parsing
-    return parse_query_simple(query, context)
+    return parse_query_simple(query, context, scanned)
 
-def parse_query_simple(query: str, context: Dict) -> Dict:
-    """Fallback simple parser using regex with conversation context"""
+def _scan_query(query: str) -> Tuple[Optional[str], Optional[str], Optional[int], Optional[str], Optional[str]]:
+    """Extract (product, specification, quantity, grade, city) from the query text alone"""
     query_lower = query.lower()
+    specification = quantity = None
+    
+    # Find product, grade and city - first mention of each kind wins
+    found = {}
+    for match in _KEYWORD_RE.finditer(query_lower):
+        found.setdefault(_KEYWORD_KINDS[match.group()], match.group())
+    
+    # Find quantity (number followed by kg)
+    qty_match = _QTY_RE.search(query_lower)
+    if qty_match:
+        quantity = int(qty_match.group(1))
+    
+    # Find specification (percentage)
+    spec_match = _PCT_RE.search(query_lower)
+    if spec_match:
+        specification = f"{spec_match.group(1)}%"
+    
+    return found.get("product"), specification, quantity, found.get("grade"), found.get("city")
+
+def parse_query_simple(query: str, context: Dict, scanned: Optional[Tuple] = None) -> Dict:
+    """Fallback simple parser using regex with conversation context
+    
+    scanned is the query's _scan_query result, when the caller already has it."""
+    product, specification, quantity, grade, city = scanned or _scan_query(query)
     
     # Start with existing context
     result = context.copy()
     
-    # Find product
-    for product_key in PRODUCTS:
-        if product_key in query_lower:
-            result["product"] = product_key
-            break
+    if product:
+        result["product"] = product
     
-    # Find quantity (number followed by kg or just a number if we have context)
-    qty_match = re.search(r'(\d+)\s*kg', query_lower)
-    if qty_match:
-        result["quantity"] = int(qty_match.group(1))
-    elif result.get("product") and re.match(r'^\d+$', query.strip()):
+    # Quantity: number followed by kg, or just a number if we have context
+    if quantity is not None:
+        result["quantity"] = quantity
+    elif result.get("product") and _BARE_INT_RE.match(query.strip()):
         # Just a number, assume it's quantity if we have a product in context
         result["quantity"] = int(query.strip())
     
-    # Find specification (percentage)
-    spec_match = re.findall(r'(\d+(?:\.\d+)?)\s*%', query_lower)
-    if spec_match:
-        result["specification"] = f"{spec_match[0]}%"
-    elif result.get("product") and re.match(r'^\d+(?:\.\d+)?$', query.strip()):
+    # Specification: percentage, or just a number without % if we have context
+    if specification:
+        result["specification"] = specification
+    elif result.get("product") and _BARE_NUMBER_RE.match(query.strip()):
         # Just a number without %, assume it's specification if we have a product
         result["specification"] = f"{query.strip()}%"
     
-    # Find grade
-    for grade in GRADE_PREMIUMS:
-        if grade in query_lower:
-            result["grade"] = grade
-            break
+    if grade:
+        result["grade"] = grade
     
-    # Find city
-    for city in DELIVERY_COSTS:
-        if city in query_lower:
-            result["city"] = city
-            break
+    if city:
+        result["city"] = city
     
     return result
 
 def get_volume_discount(quantity: int) -> Tuple[int, str]:
     """Calculate volume discount based on quantity"""
-    for (min_qty, max_qty), discount in VOLUME_DISCOUNTS.items():
-        if min_qty <= quantity <= max_qty:
-            return discount, f"{min_qty}-{max_qty}kg" if max_qty != float('inf') else f"{min_qty}+kg"
-    return 0, "No discount"
+    tier = bisect_right(_TIER_THRESHOLDS, quantity) - 1
+    if tier < 0:
+        return 0, "No discount"
+    return _TIER_DATA[tier]
 
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
 def calculate_quotation(product: str, specification: str, quantity: int, grade: str, city: str) -> Dict:
-    """Calculate complete quotation with all pricing components"""
+    """Calculate complete quotation with all pricing components
     
-    # Get product details
-    product_info = PRODUCTS[product]
-    spec_info = product_info["specifications"][specification]
+    Pure in its inputs, so it is cached; the caller adds the date-dependent validity."""
     
-    base_price = spec_info["base_price"]
-    moq = spec_info["moq"]
+    # Get product details
+    base_price, moq, product_name, unit = _PRICE_TABLE[(product, specification)]
     
     # Check MOQ
     if quantity < moq:
@@ -244,8 +395,8 @@ def calculate_quotation(product: str, specification: str, quantity: int, grade:
     total = subtotal_before_gst + gst_amount
     
     return {
-        "product_name": product_info["name"],
-        "specification": f"{specification} {product_info['unit']}",
+        "product_name": product_name,
+        "specification": f"{specification} {unit}",
         "grade": grade.title(),
         "quantity": quantity,
         "base_price": base_price,
@@ -261,54 +412,51 @@ def calculate_quotation(product: str, specification: str, quantity: int, grade:
         "gst_amount": gst_amount,
         "total": total,
         "moq": moq,
-        "lead_time": "2-3 days",
-        "validity": (datetime.now() + timedelta(days=7)).strftime("%d %b %Y")
+        "lead_time": "2-3 days"
     }
 
-def format_quotation(quote: Dict) -> str:
-    """Format quotation in professional format"""
-    
-    if "error" in quote:
-        return f"❌ {quote['error']}"
-    
-    formatted = f"""
+def quote_validity() -> str:
+    """Date until which a quotation issued today is valid"""
+    return (datetime.now() + timedelta(days=7)).strftime("%d %b %Y")
+
+# Quotation layout, filled in with str.format_map from the quote dict
+_QUOTE_TEMPLATE = """
 **ALCHEMY CHEMICALS - QUOTATION**
 ---
-**Product:** {quote['product_name']}
-**Specification:** {quote['specification']}
-**Grade:** {quote['grade']}
-**Quantity:** {quote['quantity']}kg
+**Product:** {product_name}
+**Specification:** {specification}
+**Grade:** {grade}
+**Quantity:** {quantity}kg
 
 **Pricing Breakdown:**
-- Base Price: ₹{quote['base_price']:,}/kg
-- Subtotal: ₹{quote['subtotal']:,}
-- Volume Discount ({quote['volume_tier']} tier): -{quote['volume_discount_pct']}% = -₹{quote['volume_discount_amt']:,}
-- Grade Premium ({quote['grade']}): +{quote['grade_premium_pct']}% = +₹{quote['grade_premium_amt']:,}
-- Delivery ({quote['delivery_city']}): ₹{quote['delivery_cost']:,}
-- **Subtotal:** ₹{quote['subtotal_before_gst']:,}
-- GST (18%): ₹{quote['gst_amount']:,.0f}
+- Base Price: ₹{base_price:,}/kg
+- Subtotal: ₹{subtotal:,}
+- Volume Discount ({volume_tier} tier): -{volume_discount_pct}% = -₹{volume_discount_amt:,}
+- Grade Premium ({grade}): +{grade_premium_pct}% = +₹{grade_premium_amt:,}
+- Delivery ({delivery_city}): ₹{delivery_cost:,}
+- **Subtotal:** ₹{subtotal_before_gst:,}
+- GST (18%): ₹{gst_amount:,.0f}
 
-**TOTAL: ₹{quote['total']:,.0f}**
+**TOTAL: ₹{total:,.0f}**
 
 **Terms & Conditions:**
-- MOQ: {quote['moq']}kg
-- Lead Time: {quote['lead_time']}
-- Quote Validity: Until {quote['validity']}
+- MOQ: {moq}kg
+- Lead Time: {lead_time}
+- Quote Validity: Until {validity}
 - Certifications: ISO 9001:2015, GMP, FDA
 
 **For order confirmation:** info@alchemychemicals.net
 """
-    return formatted
 
-def is_greeting_or_general(query: str) -> Optional[str]:
-    """Detect greetings and general queries, return friendly response"""
-    query_lower = query.lower().strip()
+def format_quotation(quote: Dict) -> str:
+    """Format quotation in professional format"""
+    
+    if "error" in quote:
+        return f"❌ {quote['error']}"
     
-    # Greetings - check for exact matches or word boundaries to avoid false positives (like "Delhi" containing "hi")
-    greetings = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'namaste']
-    # Use word boundaries to match only complete words
-    if any(re.search(rf'\b{re.escape(greeting)}\b', query_lower) for greeting in greetings):
-        return """Hello! 👋 Welcome to Alchemy Chemicals!
+    return _QUOTE_TEMPLATE.format_map(quote)
+
+_GREETING_RESPONSE = """Hello! 👋 Welcome to Alchemy Chemicals!
 
 I'm your AI quotation assistant. I can help you get instant price quotes for our premium herbal extracts.
 
@@ -325,11 +473,8 @@ I'm your AI quotation assistant. I can help you get instant price quotes for our
 • "Quote for Boswellia extract"
 
 How can I help you today? 😊"""
-    
-    # Help queries
-    help_terms = ['help', 'how to use', 'what can you do', 'how does this work']
-    if any(term in query_lower for term in help_terms):
-        return """I'm here to help! 🤝
+
+_HELP_RESPONSE = """I'm here to help! 🤝
 
 **How to get a quotation:**
 Just tell me what you need in plain English. Include:
@@ -343,11 +488,8 @@ Just tell me what you need in plain English. Include:
 "I need 50kg of Ashwagandha extract 5% withanolides, pharmaceutical grade, delivery to Mumbai"
 
 Don't worry about perfect formatting - I understand natural language! Try asking now. 💬"""
-    
-    # Thank you
-    thank_terms = ['thank', 'thanks', 'appreciate']
-    if any(term in query_lower for term in thank_terms):
-        return """You're very welcome! 😊
+
+_THANK_RESPONSE = """You're very welcome! 😊
 
 Is there anything else you'd like to know?
 • Need a quote for a different product?
@@ -355,15 +497,19 @@ Is there anything else you'd like to know?
 • Questions about pricing or delivery?
 
 I'm here to help!"""
+
+# Canned replies by intent, in priority order when a query matches more than one
+_INTENT_RESPONSES = {
+    "greet": _GREETING_RESPONSE,
+    "help": _HELP_RESPONSE,
+    "thank": _THANK_RESPONSE
+}
+
+def _product_inquiry_response(product_info: Dict) -> str:
+    """Reply to a short inquiry about one product"""
+    specs = list(product_info["specifications"].keys())
     
-    # Product inquiry without details
-    products_mentioned = [p for p in PRODUCTS.keys() if p in query_lower]
-    if products_mentioned and len(query_lower.split()) < 8:  # Short query
-        product = products_mentioned[0]
-        product_info = PRODUCTS[product]
-        specs = list(product_info["specifications"].keys())
-        
-        return f"""Great choice! I can help you with **{product_info['name']}**. 🌿
+    return f"""Great choice! I can help you with **{product_info['name']}**. 🌿
 
 **Available specifications:**
 {chr(10).join([f'• {spec} {product_info["unit"]}' for spec in specs])}
@@ -378,6 +524,24 @@ I'm here to help!"""
 "I need 50kg of {product_info['name']} {specs[0]} {product_info['unit']}, pharmaceutical grade, Mumbai delivery"
 
 What would you like? 😊"""
+
+# Built once per product instead of on every inquiry
+_PRODUCT_INQUIRY = {product: _product_inquiry_response(product_info) for product, product_info in PRODUCTS.items()}
+
+def is_greeting_or_general(query: str) -> Optional[str]:
+    """Detect greetings and general queries, return friendly response"""
+    query_lower = query.lower().strip()
+    
+    # Greetings, help and thanks in one scan; the highest-priority intent found wins
+    intents = {match.lastgroup for match in _INTENT_RE.finditer(query_lower)}
+    for intent, response in _INTENT_RESPONSES.items():
+        if intent in intents:
+            return response
+    
+    # Product inquiry without details - reuses the parser's single keyword pass
+    product = _scan_query(query)[0]
+    if product and len(query_lower.split()) < 8:  # Short query
+        return _PRODUCT_INQUIRY[product]
     
     return None
 
@@ -421,6 +585,54 @@ What else can you tell me?"""
     
     return None
 
+@st.cache_data(show_spinner=False)
+def catalog_markdown() -> List[Tuple[str, str]]:
+    """Sidebar catalog as (expander title, markdown) pairs, built once rather than on every rerun"""
+    return [
+        (
+            f"🌿 {product_info['name']}",
+            "  \n".join(
+                f"• {spec} {product_info['unit']}: ₹{details['base_price']:,}/kg  \n  MOQ: {details['moq']}kg"
+                for spec, details in product_info["specifications"].items()
+            )
+        )
+        for product_info in PRODUCTS.values()
+    ]
+
+PRICING_MD = """**Volume Discounts:**  
+• 1-24kg: 0%  
+• 25-99kg: 10%  
+• 100-499kg: 15%  
+• 500+kg: 20%
+
+**Grade Premiums:**  
+• Pharmaceutical: +20%  
+• Cosmetic: +10%  
+• Food Grade: 0%"""
+
+def show_quote_actions(message: Dict, key: str):
+    """Render the download button and friendly follow-up under a quotation message"""
+    st.download_button(
+        label="📥 Download Quotation",
+        data=message["content"],
+        file_name=message["download_name"],
+        mime="text/plain",
+        key=key
+    )
+    
+    # Add friendly follow-up
+    follow_up = "\n\n---\n\n💡 **Need something else?**\n• Modify quantity or specification?\n• Get a quote for another product?\n• Compare different options?\n\nJust ask!"
+    st.markdown(follow_up)
+
+def show_conversation_memory(context: Dict):
+    """Render what the bot remembers of the quotation so far, one column per field"""
+    st.markdown("#### 🧠 Conversation Memory")
+    for column, (key, value) in zip(st.columns(len(context)), context.items()):
+        column.write(f"✅ {key.title()}: {value}" if value else f"⬜ {key.title()}: —")
+    
+    if all(v is None for v in context.values()):
+        st.caption("Start chatting to build up quotation info!")
+
 # Streamlit UI
 st.title("🧪 Alchemy Chemicals - AI Quotation Assistant")
 st.markdown("Get instant quotations for premium herbal extracts")
@@ -455,120 +667,98 @@ if "context" not in st.session_state:
 with st.sidebar:
     st.header("📋 Product Catalog")
     
-    for product_key, product_info in PRODUCTS.items():
-        with st.expander(f"🌿 {product_info['name']}"):
-            for spec, details in product_info["specifications"].items():
-                st.write(f"• {spec} {product_info['unit']}: ₹{details['base_price']:,}/kg")
-                st.write(f"  MOQ: {details['moq']}kg")
+    for title, catalog_md in catalog_markdown():
+        with st.expander(title):
+            st.markdown(catalog_md)
     
     st.divider()
     st.header("💰 Pricing Structure")
-    st.write("**Volume Discounts:**")
-    st.write("• 1-24kg: 0%")
-    st.write("• 25-99kg: 10%")
-    st.write("• 100-499kg: 15%")
-    st.write("• 500+kg: 20%")
-    
-    st.write("\n**Grade Premiums:**")
-    st.write("• Pharmaceutical: +20%")
-    st.write("• Cosmetic: +10%")
-    st.write("• Food Grade: 0%")
-    
-    # Show conversation context (what bot remembers)
-    st.divider()
-    st.header("🧠 Conversation Memory")
-    context_display = []
-    for key, value in st.session_state.context.items():
-        if value:
-            context_display.append(f"✅ {key.title()}: {value}")
-        else:
-            context_display.append(f"⬜ {key.title()}: —")
-    
-    for item in context_display:
-        st.write(item)
-    
-    if all(v is None for v in st.session_state.context.values()):
-        st.caption("Start chatting to build up quotation info!")
-
-# Main chat interface
-st.markdown("### 💬 Chat with our AI Assistant")
-
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# Chat input
-if prompt := st.chat_input("Ask for a quotation (e.g., 'Price for 50kg Ashwagandha extract 5% withanolides, pharmaceutical grade, delivery to Mumbai')"):
-    # Add user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-    
-    # Process query
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            # Check if it's a greeting or general query first
-            greeting_response = is_greeting_or_general(prompt)
-            
-            if greeting_response:
-                st.markdown(greeting_response)
-                st.session_state.messages.append({"role": "assistant", "content": greeting_response})
-                # Reset context on greeting (use word boundaries)
-                if any(re.search(rf'\b{g}\b', prompt.lower()) for g in ['hi', 'hello', 'hey']):
-                    st.session_state.context = {k: None for k in st.session_state.context}
-            else:
-                # Parse the query for quotation with conversation context
-                if model:  # Use model instead of GEMINI_API_KEY to ensure it's actually initialized
-                    parsed_data = parse_query_with_ai(prompt, st.session_state.context)
-                else:
-                    parsed_data = parse_query_simple(prompt, st.session_state.context)
-                
-                # Update context with new information
-                for key, value in parsed_data.items():
-                    if value is not None:
-                        st.session_state.context[key] = value
-                
-                # Check for missing info
-                missing_info_msg = handle_missing_info(parsed_data)
+    st.markdown(PRICING_MD)
+
+# Main chat interface - a fragment, so a chat turn reruns only this block instead of the whole page
+@st.fragment
+def chat_fragment():
+    st.markdown("### 💬 Chat with our AI Assistant")
+
+    # Filled in after the turn below, so it shows the context as this turn left it
+    memory_panel = st.container()
+
+    # Display chat history
+    for idx, message in enumerate(st.session_state.messages):
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            if message.get("download_name"):
+                show_quote_actions(message, key=f"download_{idx}")
+
+    # Chat input
+    if prompt := st.chat_input("Ask for a quotation (e.g., 'Price for 50kg Ashwagandha extract 5% withanolides, pharmaceutical grade, delivery to Mumbai')"):
+        # Add user message
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+        
+        # Process query
+        with st.chat_message("assistant"):
+            with st.spinner("Thinking..."):
+                # Check if it's a greeting or general query first
+                greeting_response = is_greeting_or_general(prompt)
                 
-                if missing_info_msg:
-                    st.info(missing_info_msg)
-                    st.session_state.messages.append({"role": "assistant", "content": missing_info_msg})
+                if greeting_response:
+                    st.markdown(greeting_response)
+                    st.session_state.messages.append({"role": "assistant", "content": greeting_response})
+                    # Reset context on greeting (use word boundaries)
+                    if _RESET_GREETING_RE.search(prompt.lower()):
+                        st.session_state.context = {k: None for k in st.session_state.context}
                 else:
-                    # All info available, calculate quotation
-                    try:
-                        quotation = calculate_quotation(
-                            parsed_data["product"],
-                            parsed_data["specification"],
-                            parsed_data["quantity"],
-                            parsed_data["grade"],
-                            parsed_data["city"]
-                        )
-                        
-                        formatted_quote = format_quotation(quotation)
-                        st.markdown(formatted_quote)
-                        
-                        # Add to history
-                        st.session_state.messages.append({"role": "assistant", "content": formatted_quote})
-                        
-                        # Add download button for quotation
-                        if "error" not in quotation:
-                            st.download_button(
-                                label="📥 Download Quotation",
-                                data=formatted_quote,
-                                file_name=f"quotation_{parsed_data['product']}_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
-                                mime="text/plain"
+                    # Parse the query for quotation with conversation context (falls back to regex without a model)
+                    parsed_data = parse_query_with_ai(prompt, st.session_state.context)
+                    
+                    # Update context with new information
+                    for key, value in parsed_data.items():
+                        if value is not None:
+                            st.session_state.context[key] = value
+                    
+                    # Check for missing info
+                    missing_info_msg = handle_missing_info(parsed_data)
+                    
+                    if missing_info_msg:
+                        st.info(missing_info_msg)
+                        st.session_state.messages.append({"role": "assistant", "content": missing_info_msg})
+                    else:
+                        # All info available, calculate quotation
+                        try:
+                            quotation = calculate_quotation(
+                                parsed_data["product"],
+                                parsed_data["specification"],
+                                parsed_data["quantity"],
+                                parsed_data["grade"],
+                                parsed_data["city"]
                             )
+                            # Cached results are copies, so adding today's validity is safe
+                            quotation["validity"] = quote_validity()
+                            
+                            formatted_quote = format_quotation(quotation)
+                            st.markdown(formatted_quote)
                             
-                            # Add friendly follow-up
-                            follow_up = "\n\n---\n\n💡 **Need something else?**\n• Modify quantity or specification?\n• Get a quote for another product?\n• Compare different options?\n\nJust ask!"
-                            st.markdown(follow_up)
+                            # Add to history; the download name lets the history replay re-render the button
+                            message = {"role": "assistant", "content": formatted_quote}
+                            if "error" not in quotation:
+                                message["download_name"] = f"quotation_{parsed_data['product']}_{datetime.now().strftime('%Y%m%d_%H%M')}.txt"
+                            st.session_state.messages.append(message)
                             
-                    except Exception as e:
-                        error_msg = f"Oops! Something went wrong: {str(e)}\n\nPlease try again or rephrase your request. I'm here to help! 😊"
-                        st.error(error_msg)
-                        st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                            # Add download button for quotation
+                            if "error" not in quotation:
+                                show_quote_actions(message, key=f"download_{len(st.session_state.messages) - 1}")
+                                
+                        except Exception as e:
+                            error_msg = f"Oops! Something went wrong: {str(e)}\n\nPlease try again or rephrase your request. I'm here to help! 😊"
+                            st.error(error_msg)
+                            st.session_state.messages.append({"role": "assistant", "content": error_msg})
+
+    with memory_panel:
+        show_conversation_memory(st.session_state.context)
+
+chat_fragment()
 
 # Example queries section
 with st.expander("📝 Example Queries"):
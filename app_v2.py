@@ -1,10 +1,12 @@
 import streamlit as st
 import google.generativeai as genai
 import json
+import orjson
 import re
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
-from difflib import get_close_matches
+from typing import Dict, List, Optional, Tuple
+from rapidfuzz import fuzz, process
 
 # Page configuration
 st.set_page_config(
@@ -22,11 +24,16 @@ except:
 if not GEMINI_API_KEY:
     GEMINI_API_KEY = st.sidebar.text_input("Gemini API Key (optional - uses smart parser if empty)", type="password")
 
+@st.cache_resource(show_spinner=False)
+def get_model(api_key: str) -> genai.GenerativeModel:
+    """Configure the client and build the model once, shared across reruns and sessions"""
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel('gemini-pro')
+
 model = None
 if GEMINI_API_KEY:
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-pro')
+        model = get_model(GEMINI_API_KEY)
         st.sidebar.success("✅ Gemini AI Active")
     except Exception as e:
         st.sidebar.warning(f"⚠️ Gemini error: Using smart parser")
@@ -112,147 +119,161 @@ DELIVERY_COSTS = {
 
 GST_RATE = 0.18
 
-def find_best_match(text: str, options: Dict, check_aliases: bool = True) -> Optional[str]:
-    """Find the best match for a given text in options, considering aliases and typos"""
+# Volume tiers by lower bound, for bisect lookup
+_TIER_THRESHOLDS = [min_qty for min_qty, _ in VOLUME_DISCOUNTS]
+_TIER_DATA = [
+    (discount, f"{min_qty}-{max_qty}kg" if max_qty != float('inf') else f"{min_qty}+kg")
+    for (min_qty, max_qty), discount in VOLUME_DISCOUNTS.items()
+]
+
+# Every product name and alias mapped to its product, names first
+_PRODUCT_INDEX = {key: key for key in PRODUCTS}
+_PRODUCT_INDEX.update(
+    (alias, key)
+    for key, value in PRODUCTS.items()
+    for alias in value["aliases"]
+)
+_PRODUCT_TERMS = tuple(_PRODUCT_INDEX)
+
+# The concentration question for each product, with its specifications joined once
+_SPEC_QUESTIONS = {
+    key: f"• Which concentration? ({'/'.join(value['specifications'])})"
+    for key, value in PRODUCTS.items()
+}
+
+# Compiled once at import instead of on every message.
+# Quantity with "kg" ("kgs" included), else another unit, else a number after for/need/want
+_QTY_KG_RE = re.compile(r'(\d+)\s*kg')
+_QTY_UNIT_RE = re.compile(r'(\d+)\s*(?:kilogram|kilos)')
+_QTY_VERB_RE = re.compile(r'(?:for|need|want)\s+(\d+)')
+_BARE_NUMBER_RE = re.compile(r'^\d+$')
+_SPEC_PATTERNS = [re.compile(pattern) for pattern in (
+    r'(\d+(?:\.\d+)?)\s*%',
+    r'(\d+(?:\.\d+)?)\s*percent',
+    r'(\d+(?:\.\d+)?)\s*concentration'
+)]
+
+# Grade names and aliases, looked up word by word so "seafood" isn't read as food grade.
+# "food grade" needs no entry of its own - its first word already matches.
+_GRADE_INDEX = {
+    term: grade_key
+    for grade_key, grade_info in GRADE_PREMIUMS.items()
+    for term in [grade_key] + grade_info["aliases"]
+}
+_WORD_RE = re.compile(r'\w+')
+
+# Every city name and alias, matched as whole words in one pass. Phrasing like "in Mumbai"
+# or "Delhi delivery" needs no patterns of its own - the bare name already matches there.
+_ALIAS_TO_CITY = {
+    alias: city_key
+    for city_key, city_info in DELIVERY_COSTS.items()
+    for alias in [city_key] + city_info["aliases"]
+}
+_CITY_RE = re.compile(r'\b(' + "|".join(re.escape(alias) for alias in sorted(_ALIAS_TO_CITY, key=len, reverse=True)) + r')\b')
+
+# Phrases that ask for usage help
+_HELP_TERMS = ('help', 'how to', 'what can you')
+
+# A greeting as the whole message or its first word(s), in any case
+_GREETING_RE = re.compile(r'\s*(?:hi|hello|hey|namaste|good\s+(?:morning|afternoon|evening))\b', re.IGNORECASE)
+
+
+def find_best_match(text: str) -> Optional[str]:
+    """Find the product a given text refers to, considering aliases and typos"""
     text_lower = text.lower().strip()
     
-    # First check exact matches
-    for key in options:
-        if key in text_lower or text_lower in key:
-            return key
+    # The whole message is a product name or alias
+    if text_lower in _PRODUCT_INDEX:
+        return _PRODUCT_INDEX[text_lower]
     
-    # Then check aliases if available
-    if check_aliases:
-        for key, value in options.items():
-            if isinstance(value, dict) and "aliases" in value:
-                for alias in value["aliases"]:
-                    if alias in text_lower or text_lower in alias:
-                        return key
+    # Names first, then aliases - the index keeps that order
+    for term, key in _PRODUCT_INDEX.items():
+        if term in text_lower or text_lower in term:
+            return key
     
     # Finally, use fuzzy matching for typos
-    all_options = list(options.keys())
-    if check_aliases:
-        for value in options.values():
-            if isinstance(value, dict) and "aliases" in value:
-                all_options.extend(value["aliases"])
-    
-    matches = get_close_matches(text_lower, all_options, n=1, cutoff=0.7)
-    if matches:
-        # Find which key this match belongs to
-        for key, value in options.items():
-            if matches[0] == key:
-                return key
-            if isinstance(value, dict) and "aliases" in value:
-                if matches[0] in value["aliases"]:
-                    return key
+    match = process.extractOne(text_lower, _PRODUCT_TERMS, scorer=fuzz.ratio, score_cutoff=70)
+    if match:
+        return _PRODUCT_INDEX[match[0]]
     
     return None
 
-def extract_all_info(text: str, context: Dict) -> Dict:
-    """Extract all possible information from user input, handling compound statements"""
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def extract_all_info(text: str, context_items: Tuple) -> Dict:
+    """Extract all possible information from user input, handling compound statements
+    
+    Takes the context as a tuple of items so the result can be cached across reruns."""
     text_lower = text.lower()
-    result = context.copy()
+    result = dict(context_items)
     
     # Extract product
-    product_found = find_best_match(text, PRODUCTS, check_aliases=True)
+    product_found = find_best_match(text)
     if product_found:
         result["product"] = product_found
     
-    # Extract quantity (with various formats)
-    qty_patterns = [
-        r'(\d+)\s*kg',
-        r'(\d+)\s*kgs',
-        r'(\d+)\s*kilogram',
-        r'(\d+)\s*kilos',
-        r'for\s+(\d+)',
-        r'need\s+(\d+)',
-        r'want\s+(\d+)'
-    ]
-    for pattern in qty_patterns:
-        match = re.search(pattern, text_lower)
+    # Quantity and specification patterns all need a digit
+    if any(char.isdigit() for char in text_lower):
+        # Extract quantity (with various formats)
+        match = _QTY_KG_RE.search(text_lower) or _QTY_UNIT_RE.search(text_lower) or _QTY_VERB_RE.search(text_lower)
         if match:
             result["quantity"] = int(match.group(1))
-            break
-    
-    # If just a number is provided and we need quantity
-    if not result.get("quantity") and re.match(r'^\d+$', text.strip()):
-        result["quantity"] = int(text.strip())
-    
-    # Extract specification
-    spec_patterns = [
-        r'(\d+(?:\.\d+)?)\s*%',
-        r'(\d+(?:\.\d+)?)\s*percent',
-        r'(\d+(?:\.\d+)?)\s*concentration'
-    ]
-    for pattern in spec_patterns:
-        match = re.search(pattern, text_lower)
-        if match:
-            spec_value = f"{match.group(1)}%"
-            # Validate against product specifications if product is known
-            if result.get("product") and result["product"] in PRODUCTS:
-                if spec_value in PRODUCTS[result["product"]]["specifications"]:
-                    result["specification"] = spec_value
+        
+        # If just a number is provided and we need quantity
+        if not result.get("quantity") and _BARE_NUMBER_RE.match(text.strip()):
+            result["quantity"] = int(text.strip())
+        
+        # Extract specification
+        for pattern in _SPEC_PATTERNS:
+            match = pattern.search(text_lower)
+            if match:
+                spec_value = f"{match.group(1)}%"
+                # Validate against product specifications if product is known
+                if result.get("product") and result["product"] in PRODUCTS:
+                    if spec_value in PRODUCTS[result["product"]]["specifications"]:
+                        result["specification"] = spec_value
+                    else:
+                        # Find closest valid specification
+                        specs = list(PRODUCTS[result["product"]]["specifications"].keys())
+                        for spec in specs:
+                            if spec.replace("%", "") == match.group(1):
+                                result["specification"] = spec
+                                break
                 else:
-                    # Find closest valid specification
-                    specs = list(PRODUCTS[result["product"]]["specifications"].keys())
-                    for spec in specs:
-                        if spec.replace("%", "") == match.group(1):
-                            result["specification"] = spec
-                            break
-            else:
-                result["specification"] = spec_value
-            break
+                    result["specification"] = spec_value
+                break
     
-    # Extract grade
-    for grade_key, grade_info in GRADE_PREMIUMS.items():
-        if grade_key in text_lower:
-            result["grade"] = grade_key
+    # Extract grade - the first word that names one, allowing a plural "s"
+    for word in _WORD_RE.findall(text_lower):
+        grade = _GRADE_INDEX.get(word) or (word.endswith("s") and _GRADE_INDEX.get(word[:-1]))
+        if grade:
+            result["grade"] = grade
             break
-        for alias in grade_info["aliases"]:
-            if alias in text_lower:
-                result["grade"] = grade_key
-                break
     
-    # Extract city
-    for city_key, city_info in DELIVERY_COSTS.items():
-        # Check for patterns like "in Mumbai", "to Delhi", "at Pune"
-        city_patterns = [
-            rf'\b(?:in|to|at|for|deliver to|delivery to|ship to)\s+{city_key}\b',
-            rf'\b{city_key}\b\s*(?:delivery|deliver|ship)',
-            rf'\b{city_key}\b'
-        ]
-        
-        for pattern in city_patterns:
-            if re.search(pattern, text_lower):
-                result["city"] = city_key
-                break
-        
-        if result.get("city"):
+    # Extract city - if several are mentioned, the first in DELIVERY_COSTS order wins
+    cities_found = {_ALIAS_TO_CITY[match.group(1)] for match in _CITY_RE.finditer(text_lower)}
+    for city_key in DELIVERY_COSTS:
+        if city_key in cities_found:
+            result["city"] = city_key
             break
-            
-        # Check aliases
-        for alias in city_info["aliases"]:
-            for pattern in city_patterns:
-                pattern_alias = pattern.replace(city_key, alias)
-                if re.search(pattern_alias, text_lower):
-                    result["city"] = city_key
-                    break
-            if result.get("city"):
-                break
     
     return result
 
-def parse_with_ai(query: str, context: Dict) -> Dict:
-    """Use Gemini AI for intelligent parsing with context awareness"""
-    if not model:
-        return extract_all_info(query, context)
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def _parse_with_gemini(query: str, context_items: Tuple, model_name: str, _model: genai.GenerativeModel) -> Dict:
+    """Ask Gemini to parse the message; cached so a repeated prompt skips the API call
     
-    context_str = json.dumps({k: v for k, v in context.items() if v}, indent=2)
+    The model name is part of the cache key, so replies from one model aren't served for
+    another; _model itself is left out of the key.
+    Raises when no JSON comes back, so failed calls aren't cached and the caller can fall back."""
+    context = dict(context_items)
+    # Known fields only, as compact JSON, to keep the prompt short
+    known = {k: v for k, v in context_items if v}
+    context_str = json.dumps(known, separators=(",", ":")) if known else "No previous information"
     
     prompt = f"""You are helping process an order for herbal extracts. Parse the user's message and extract/update order information.
 
 Current order context:
-{context_str if context_str != '{{}}' else 'No previous information'}
+{context_str}
 
 User message: "{query}"
 
@@ -270,36 +291,40 @@ Important:
 - Keep previous context values if not explicitly changed
 - Return ONLY the JSON object, no explanations"""
     
+    response = _model.generate_content(prompt)
+    result_text = response.text.strip()
+    
+    # Extract JSON from response - from the first "{" to the last "}"
+    start = result_text.find("{")
+    end = result_text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("No JSON object in Gemini response")
+    parsed = orjson.loads(result_text[start:end + 1])
+    
+    # Merge with context
+    merged = context.copy()
+    for key, value in parsed.items():
+        if value:
+            merged[key] = value
+    return merged
+
+def parse_with_ai(query: str, context: Dict) -> Dict:
+    """Use Gemini AI for intelligent parsing with context awareness"""
+    context_items = tuple(context.items())
+    if not model:
+        return extract_all_info(query, context_items)
+    
     try:
-        response = model.generate_content(prompt)
-        result_text = response.text.strip()
-        
-        # Extract JSON from response
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-        if json_match:
-            parsed = json.loads(json_match.group())
-            # Merge with context
-            merged = context.copy()
-            for key, value in parsed.items():
-                if value:
-                    merged[key] = value
-            return merged
+        return _parse_with_gemini(query, context_items, model.model_name, model)
     except:
         pass
     
     # Fallback to smart parser
-    return extract_all_info(query, context)
+    return extract_all_info(query, context_items)
 
 def is_greeting(text: str) -> bool:
     """Check if text is a greeting using word boundaries"""
-    greetings = ['hi', 'hello', 'hey', 'namaste', 'good morning', 'good afternoon', 'good evening']
-    text_lower = text.lower().strip()
-    
-    for greeting in greetings:
-        # Check for exact match or word boundary match
-        if text_lower == greeting or re.match(rf'^{greeting}\b', text_lower) or re.match(rf'\b{greeting}$', text_lower):
-            return True
-    return False
+    return bool(_GREETING_RE.match(text))
 
 def generate_response(parsed_data: Dict) -> str:
     """Generate intelligent conversational response based on what's missing"""
@@ -345,9 +370,7 @@ def generate_response(parsed_data: Dict) -> str:
     if not parsed_data.get("product"):
         questions.append("• Which product? (Ashwagandha/Boswellia/Curcumin/Neem/Tulsi)")
     elif not parsed_data.get("specification"):
-        product = parsed_data["product"]
-        specs = list(PRODUCTS[product]["specifications"].keys())
-        questions.append(f"• Which concentration? ({'/'.join(specs)})")
+        questions.append(_SPEC_QUESTIONS[parsed_data["product"]])
     
     if not parsed_data.get("quantity"):
         questions.append("• How many kg?")
@@ -368,10 +391,10 @@ def generate_response(parsed_data: Dict) -> str:
 
 def get_volume_discount(quantity: int) -> Tuple[int, str]:
     """Calculate volume discount based on quantity"""
-    for (min_qty, max_qty), discount in VOLUME_DISCOUNTS.items():
-        if min_qty <= quantity <= max_qty:
-            return discount, f"{min_qty}-{max_qty}kg" if max_qty != float('inf') else f"{min_qty}+kg"
-    return 0, "No discount"
+    tier = bisect_right(_TIER_THRESHOLDS, quantity) - 1
+    if tier < 0:
+        return 0, "No discount"
+    return _TIER_DATA[tier]
 
 def calculate_quotation(parsed_data: Dict) -> Dict:
     """Calculate complete quotation with all pricing components"""
@@ -437,34 +460,30 @@ def calculate_quotation(parsed_data: Dict) -> Dict:
         "validity": (datetime.now() + timedelta(days=7)).strftime("%d %b %Y")
     }
 
-def format_quotation(quote: Dict) -> str:
-    """Format quotation in professional format"""
-    if "error" in quote:
-        return f"❌ {quote['error']}"
-    
-    return f"""
+# Quotation layout, filled in with str.format_map from the quote dict
+_QUOTE_TEMPLATE = """
 **ALCHEMY CHEMICALS - QUOTATION** 📋
 ---
-**Product:** {quote['product_name']}
-**Specification:** {quote['specification']}
-**Grade:** {quote['grade']}
-**Quantity:** {quote['quantity']}kg
+**Product:** {product_name}
+**Specification:** {specification}
+**Grade:** {grade}
+**Quantity:** {quantity}kg
 
 **💰 Pricing Breakdown:**
-• Base Price: ₹{quote['base_price']:,}/kg
-• Subtotal: ₹{quote['subtotal']:,}
-• Volume Discount ({quote['volume_tier']} tier): -{quote['volume_discount_pct']}% = **-₹{quote['volume_discount_amt']:,}**
-• Grade Premium ({quote['grade']}): +{quote['grade_premium_pct']}% = **+₹{quote['grade_premium_amt']:,}**
-• Delivery ({quote['delivery_city']}): **₹{quote['delivery_cost']:,}**
-• **Subtotal:** ₹{quote['subtotal_before_gst']:,}
-• GST (18%): ₹{quote['gst_amount']:,.0f}
+• Base Price: ₹{base_price:,}/kg
+• Subtotal: ₹{subtotal:,}
+• Volume Discount ({volume_tier} tier): -{volume_discount_pct}% = **-₹{volume_discount_amt:,}**
+• Grade Premium ({grade}): +{grade_premium_pct}% = **+₹{grade_premium_amt:,}**
+• Delivery ({delivery_city}): **₹{delivery_cost:,}**
+• **Subtotal:** ₹{subtotal_before_gst:,}
+• GST (18%): ₹{gst_amount:,.0f}
 
-**📍 TOTAL: ₹{quote['total']:,.0f}**
+**📍 TOTAL: ₹{total:,.0f}**
 
 **Terms & Conditions:**
-• MOQ: {quote['moq']}kg
-• Lead Time: {quote['lead_time']}
-• Quote Validity: Until {quote['validity']}
+• MOQ: {moq}kg
+• Lead Time: {lead_time}
+• Quote Validity: Until {validity}
 • Certifications: ISO 9001:2015, GMP, FDA
 
 **For order confirmation:** info@alchemychemicals.net
@@ -473,6 +492,64 @@ def format_quotation(quote: Dict) -> str:
 ✨ **Thank you for choosing Alchemy Chemicals!**
 """
 
+def format_quotation(quote: Dict) -> str:
+    """Format quotation in professional format"""
+    if "error" in quote:
+        return f"❌ {quote['error']}"
+    
+    return _QUOTE_TEMPLATE.format_map(quote)
+
+@st.cache_data(show_spinner=False)
+def catalog_markdown() -> List[Tuple[str, str]]:
+    """Sidebar catalog as (expander title, markdown) pairs, built once rather than on every rerun"""
+    return [
+        (
+            f"🌿 {product_info['name']}",
+            "  \n".join(
+                f"• {spec} {product_info['unit']}: ₹{details['base_price']:,}/kg  \n  MOQ: {details['moq']}kg"
+                for spec, details in product_info["specifications"].items()
+            )
+        )
+        for product_info in PRODUCTS.values()
+    ]
+
+def show_quote_actions(message: Dict, key: str):
+    """Render the download button and next-step suggestions under a quotation message"""
+    st.download_button(
+        label="📥 Download Quotation",
+        data=message["content"],
+        file_name=message["download_name"],
+        mime="text/plain",
+        key=key
+    )
+    
+    # Offer next steps
+    follow_up = """
+---
+**What would you like to do next?** 🤔
+• Modify this quote? Just tell me what to change!
+• Get a quote for another product? Just name it!
+• Compare different specifications? Ask away!
+
+I'm here to help! 😊"""
+    st.markdown(follow_up)
+
+def show_memory(context: Dict):
+    """Render what I remember of the order so far, one column per field"""
+    st.markdown("#### 🧠 What I Remember")
+    memory_items = [
+        f"✅ Product: **{PRODUCTS[context['product']]['name']}**" if context["product"] else "⬜ Product: —",
+        f"✅ Specification: **{context['specification']}**" if context["specification"] else "⬜ Specification: —",
+        f"✅ Quantity: **{context['quantity']}kg**" if context["quantity"] else "⬜ Quantity: —",
+        f"✅ Grade: **{context['grade'].title()}**" if context["grade"] else "⬜ Grade: —",
+        f"✅ City: **{context['city'].title()}**" if context["city"] else "⬜ City: —"
+    ]
+    for column, item in zip(st.columns(len(memory_items)), memory_items):
+        column.markdown(item)
+    
+    if st.session_state.filled == 0:
+        st.caption("Start chatting to build your order!")
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -507,6 +584,10 @@ if "context" not in st.session_state:
         "city": None
     }
 
+# Number of context fields filled in, updated whenever the context changes
+if "filled" not in st.session_state:
+    st.session_state.filled = sum(v is not None for v in st.session_state.context.values())
+
 # Streamlit UI
 st.title("🧪 Alchemy Chemicals - AI Quotation Assistant")
 st.markdown("Powered by conversational AI • Understands natural language • Remembers context")
@@ -514,74 +595,47 @@ st.markdown("Powered by conversational AI • Understands natural language • R
 # Sidebar
 with st.sidebar:
     st.header("📋 Product Catalog")
-    for product_key, product_info in PRODUCTS.items():
-        with st.expander(f"🌿 {product_info['name']}"):
-            for spec, details in product_info["specifications"].items():
-                st.write(f"• {spec} {product_info['unit']}: ₹{details['base_price']:,}/kg")
-                st.write(f"  MOQ: {details['moq']}kg")
+    for title, catalog_md in catalog_markdown():
+        with st.expander(title):
+            st.markdown(catalog_md)
     
     st.divider()
-    st.header("🧠 What I Remember")
-    
-    memory_items = []
-    if st.session_state.context["product"]:
-        memory_items.append(f"✅ Product: **{PRODUCTS[st.session_state.context['product']]['name']}**")
-    else:
-        memory_items.append("⬜ Product: —")
-        
-    if st.session_state.context["specification"]:
-        memory_items.append(f"✅ Specification: **{st.session_state.context['specification']}**")
-    else:
-        memory_items.append("⬜ Specification: —")
-        
-    if st.session_state.context["quantity"]:
-        memory_items.append(f"✅ Quantity: **{st.session_state.context['quantity']}kg**")
-    else:
-        memory_items.append("⬜ Quantity: —")
-        
-    if st.session_state.context["grade"]:
-        memory_items.append(f"✅ Grade: **{st.session_state.context['grade'].title()}**")
-    else:
-        memory_items.append("⬜ Grade: —")
-        
-    if st.session_state.context["city"]:
-        memory_items.append(f"✅ City: **{st.session_state.context['city'].title()}**")
-    else:
-        memory_items.append("⬜ City: —")
-    
-    for item in memory_items:
-        st.markdown(item)
-    
-    if all(v is None for v in st.session_state.context.values()):
-        st.caption("Start chatting to build your order!")
-    
     # Clear context button
     if st.button("🔄 Start New Quote"):
         st.session_state.context = {k: None for k in st.session_state.context}
+        st.session_state.filled = 0
         st.rerun()
 
-# Main chat interface
-st.markdown("### 💬 Chat with me naturally!")
-
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# Chat input
-if prompt := st.chat_input("Type naturally... I understand context, typos, and compound sentences!"):
-    # Add user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-    
-    # Process query
-    with st.chat_message("assistant"):
-        with st.spinner("Understanding your request..."):
+# Main chat interface - a fragment, so a chat turn reruns only this block instead of the whole page
+@st.fragment
+def chat_fragment():
+    st.markdown("### 💬 Chat with me naturally!")
+    
+    # Filled in after the turn below, so it shows the order as this turn left it
+    memory_panel = st.container()
+
+    # Display chat history
+    for idx, message in enumerate(st.session_state.messages):
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            if message.get("download_name"):
+                show_quote_actions(message, key=f"download_{idx}")
+
+    # Chat input
+    if prompt := st.chat_input("Type naturally... I understand context, typos, and compound sentences!"):
+        # Add user message
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+    
+        # Process query
+        prompt_lower = prompt.lower()
+        with st.chat_message("assistant"):
+            with st.spinner("Understanding your request..."):
             
-            # Check for greeting
-            if is_greeting(prompt):
-                response = """Hello! 👋 Great to see you!
+                # Check for greeting
+                if is_greeting(prompt):
+                    response = """Hello! 👋 Great to see you!
 
 I'm here to help you get instant quotations for our herbal extracts. 
 
@@ -591,14 +645,15 @@ I'm here to help you get instant quotations for our herbal extracts.
 • Ask questions about our products
 
 I remember our conversation, so just tell me what you need! 😊"""
-                st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
-                # Reset context on greeting
-                st.session_state.context = {k: None for k in st.session_state.context}
+                    st.markdown(response)
+                    st.session_state.messages.append({"role": "assistant", "content": response})
+                    # Reset context on greeting
+                    st.session_state.context = {k: None for k in st.session_state.context}
+                    st.session_state.filled = 0
                 
-            # Check for help request
-            elif any(word in prompt.lower() for word in ['help', 'how to', 'what can you']):
-                response = """**I'm here to help!** 🤝
+                # Check for help request
+                elif any(term in prompt_lower for term in _HELP_TERMS):
+                    response = """**I'm here to help!** 🤝
 
 I understand natural language, so just chat with me like you would with a human sales representative.
 
@@ -614,63 +669,58 @@ I understand natural language, so just chat with me like you would with a human
 • Different formats ("in Pune", "to Delhi", "at Mumbai")
 • Context (I remember what you've told me)
 
-**Current order status:** Check the sidebar to see what I remember!
+**Current order status:** Check "What I Remember" above the chat!
 
 What would you like to order? 💬"""
-                st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                    st.markdown(response)
+                    st.session_state.messages.append({"role": "assistant", "content": response})
                 
-            else:
-                # Parse the query with context
-                if model:
-                    parsed_data = parse_with_ai(prompt, st.session_state.context)
                 else:
-                    parsed_data = extract_all_info(prompt, st.session_state.context)
+                    # Parse the query with context
+                    if model:
+                        parsed_data = parse_with_ai(prompt, st.session_state.context)
+                    else:
+                        parsed_data = extract_all_info(prompt, tuple(st.session_state.context.items()))
                 
-                # Update context
-                for key, value in parsed_data.items():
-                    if value is not None:
-                        st.session_state.context[key] = value
+                    # Update context
+                    for key, value in parsed_data.items():
+                        if value is not None:
+                            st.session_state.context[key] = value
+                    st.session_state.filled = sum(v is not None for v in st.session_state.context.values())
                 
-                # Generate appropriate response
-                response = generate_response(st.session_state.context)
+                    # Generate appropriate response
+                    response = generate_response(st.session_state.context)
                 
-                if response:
-                    # Still missing information
-                    st.markdown(response)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                else:
-                    # We have everything - generate quotation
-                    try:
-                        quotation = calculate_quotation(st.session_state.context)
-                        formatted_quote = format_quotation(quotation)
-                        st.markdown(formatted_quote)
-                        st.session_state.messages.append({"role": "assistant", "content": formatted_quote})
-                        
-                        # Add download button
-                        if "error" not in quotation:
-                            st.download_button(
-                                label="📥 Download Quotation",
-                                data=formatted_quote,
-                                file_name=f"quotation_{st.session_state.context['product']}_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
-                                mime="text/plain"
-                            )
+                    if response:
+                        # Still missing information
+                        st.markdown(response)
+                        st.session_state.messages.append({"role": "assistant", "content": response})
+                    else:
+                        # We have everything - generate quotation
+                        try:
+                            quotation = calculate_quotation(st.session_state.context)
+                            formatted_quote = format_quotation(quotation)
+                            st.markdown(formatted_quote)
                             
-                            # Offer next steps
-                            follow_up = """
----
-**What would you like to do next?** 🤔
-• Modify this quote? Just tell me what to change!
-• Get a quote for another product? Just name it!
-• Compare different specifications? Ask away!
-
-I'm here to help! 😊"""
-                            st.markdown(follow_up)
+                            # Add to history; the download name lets the history replay re-render the button
+                            message = {"role": "assistant", "content": formatted_quote}
+                            if "error" not in quotation:
+                                message["download_name"] = f"quotation_{st.session_state.context['product']}_{datetime.now().strftime('%Y%m%d_%H%M')}.txt"
+                            st.session_state.messages.append(message)
                             
-                    except Exception as e:
-                        error_msg = f"I encountered an issue: {str(e)}\n\nCould you please rephrase or provide the missing information? I'm here to help! 😊"
-                        st.error(error_msg)
-                        st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                            # Add download button and next steps
+                            if "error" not in quotation:
+                                show_quote_actions(message, key=f"download_{len(st.session_state.messages) - 1}")
+                            
+                        except Exception as e:
+                            error_msg = f"I encountered an issue: {str(e)}\n\nCould you please rephrase or provide the missing information? I'm here to help! 😊"
+                            st.error(error_msg)
+                            st.session_state.messages.append({"role": "assistant", "content": error_msg})
+    
+    with memory_panel:
+        show_memory(st.session_state.context)
+
+chat_fragment()
 
 # Example section
 with st.expander("💡 Conversation Examples"):
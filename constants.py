@@ -0,0 +1,145 @@
+"""Catalog, pricing and delivery data shared by the quotation assistant"""
+
+from typing import NamedTuple
+
+# Product catalog
+PRODUCT_CATALOG = """
+PRODUCT CATALOG:
+1. Ashwagandha Extract
+   - Specifications: 2.5%, 5%, 10% Withanolides
+   - Base prices: ₹1,800/kg, ₹2,800/kg, ₹3,600/kg
+   - MOQ: 25kg, 25kg, 20kg
+
+2. Boswellia Extract
+   - Specifications: 65%, 85% Boswellic Acid
+   - Base prices: ₹2,200/kg, ₹3,200/kg
+   - MOQ: 25kg, 20kg
+
+3. Curcumin Extract
+   - Specifications: 90%, 95%, 98% Purity
+   - Base prices: ₹2,500/kg, ₹3,000/kg, ₹3,800/kg
+   - MOQ: 25kg, 25kg, 20kg
+
+4. Neem Extract
+   - Specifications: 1%, 5% Azadirachtin
+   - Base prices: ₹1,500/kg, ₹2,600/kg
+   - MOQ: 30kg, 25kg
+
+5. Tulsi Extract
+   - Specifications: 2%, 5% Ursolic Acid
+   - Base prices: ₹1,700/kg, ₹2,400/kg
+   - MOQ: 30kg, 25kg
+
+PRICING STRUCTURE:
+- Volume Discounts: 1-24kg: 0%, 25-99kg: 10%, 100-499kg: 15%, 500+kg: 20%
+- Grade Premiums: Pharmaceutical: +20%, Cosmetic: +10%, Food: 0%
+- Delivery: Mumbai: ₹3,500, Delhi: ₹4,200, Bangalore: ₹4,800, Pune: ₹3,200, Ujjain/Local: ₹1,000
+- GST: 18% on total
+"""
+
+# Products data for calculation
+PRODUCTS = {
+    "ashwagandha": {
+        "name": "Ashwagandha Extract",
+        "unit": "Withanolides",
+        "specifications": {
+            "2.5%": {"base_price": 1800, "moq": 25},
+            "5%": {"base_price": 2800, "moq": 25},
+            "10%": {"base_price": 3600, "moq": 20}
+        }
+    },
+    "boswellia": {
+        "name": "Boswellia Extract",
+        "unit": "Boswellic Acid",
+        "specifications": {
+            "65%": {"base_price": 2200, "moq": 25},
+            "85%": {"base_price": 3200, "moq": 20}
+        }
+    },
+    "curcumin": {
+        "name": "Curcumin Extract",
+        "unit": "Purity",
+        "specifications": {
+            "90%": {"base_price": 2500, "moq": 25},
+            "95%": {"base_price": 3000, "moq": 25},
+            "98%": {"base_price": 3800, "moq": 20}
+        }
+    },
+    "neem": {
+        "name": "Neem Extract",
+        "unit": "Azadirachtin",
+        "specifications": {
+            "1%": {"base_price": 1500, "moq": 30},
+            "5%": {"base_price": 2600, "moq": 25}
+        }
+    },
+    "tulsi": {
+        "name": "Tulsi Extract",
+        "unit": "Ursolic Acid",
+        "specifications": {
+            "2%": {"base_price": 1700, "moq": 30},
+            "5%": {"base_price": 2400, "moq": 25}
+        }
+    }
+}
+
+VOLUME_DISCOUNTS = {
+    (1, 24): 0,
+    (25, 99): 10,
+    (100, 499): 15,
+    (500, float('inf')): 20
+}
+
+GRADE_PREMIUMS = {
+    "pharmaceutical": 20,
+    "cosmetic": 10,
+    "food": 0
+}
+
+DELIVERY_COSTS = {
+    "mumbai": 3500,
+    "delhi": 4200,
+    "bangalore": 4800,
+    "pune": 3200,
+    "ujjain": 1000,
+    "local": 1000
+}
+
+GST_RATE = 0.18
+
+# Gemini model shared by the assistants - Flash is plenty for slot filling, and much faster than gemini-pro
+GEMINI_MODEL = 'gemini-2.0-flash'
+# Explicit context caching needs a pinned model version
+GEMINI_CACHE_MODEL = 'models/gemini-2.0-flash-001'
+# Smallest prompt the API accepts for explicit context caching, in tokens
+CONTEXT_CACHE_MIN_TOKENS = 32768
+# Rough characters per token, for judging a prompt's size without an API call
+CHARS_PER_TOKEN = 4
+
+# Quotation results. Defined outside the app script, whose classes are re-created on every run,
+# so st.cache_data can pickle them and isinstance checks see the same class
+class Quote(NamedTuple):
+    """Priced quotation, as produced by calculate_quotation"""
+    product_name: str
+    specification: str
+    grade: str
+    quantity: int
+    base_price: int
+    subtotal: int
+    volume_discount_pct: int
+    volume_tier: str
+    volume_discount_amt: float
+    grade_premium_pct: int
+    grade_premium_amt: float
+    delivery_city: str
+    delivery_cost: int
+    subtotal_before_gst: float
+    gst_amount: float
+    total: float
+    moq: int
+    lead_time: str
+    validity: str
+
+class QuoteError(NamedTuple):
+    """Why an order could not be priced"""
+    error: str